@@ -1,12 +1,60 @@
 import click
 from pathlib import Path
+import os
 import random
 import shutil
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import cv2
+from typing import Optional
+import av
 import sys 
 
+
+def get_video_duration(
+    video_path: Path
+) -> Optional[float]:
+    """
+    Reads the duration of a video in seconds from its container header
+    without initializing a decoder.
+
+    Args:
+        video_path (Path): Path to the video file.
+
+    Returns:
+        The duration in seconds, or None if it could not be determined.
+    """
+    with av.open(str(video_path), metadata_errors='ignore') as container:
+        if container.streams.video:
+            stream = container.streams.video[0]
+            if stream.duration is not None and stream.time_base is not None:
+                return float(stream.duration * stream.time_base)
+        if container.duration is not None:
+            return container.duration / av.time_base
+    return None
+
+
+def probe_video(
+    video_path: Path
+) -> Optional[dict]:
+    """
+    Probes a single video for its duration.
+
+    Args:
+        video_path (Path): Path to the video file.
+
+    Returns:
+        A dict with 'path' and 'duration' keys, or None if the video
+        could not be analyzed.
+    """
+    try:
+        duration = get_video_duration(video_path)
+        if duration is not None and duration > 0:
+            return {'path': video_path, 'duration': duration}
+    except Exception as e:
+        click.echo(f"Warning: Could not analyze video {video_path}: {e}", err=True)
+    return None
+
 @click.command()
 @click.option(
     '--input-dir',
@@ -67,34 +115,37 @@ def create_dataset_cli(
     min_len = min_len_threshold if min_len_threshold is not None else 0.0
     max_len = max_len_threshold if max_len_threshold is not None else sys.float_info.max
 
-    all_video_files = list(input_dir.glob("*.mp4"))
+    all_video_files = [
+        Path(entry.path) for entry in os.scandir(input_dir)
+        if entry.is_file() and entry.name.lower().endswith('.mp4')
+    ]
     if not all_video_files:
         click.echo(f"No .mp4 files found in '{input_dir}'.", err=True)
         return
 
     click.echo(f"Found {len(all_video_files)} total video files. Analyzing and filtering by length...")
     
-    valid_videos = []
-    for video_path in tqdm(all_video_files, desc="Analyzing all videos"):
-        try:
-            cap = cv2.VideoCapture(str(video_path))
-            if not cap.isOpened():
-                continue
-            
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            cap.release()
-
-            if fps > 0 and frame_count > 0:
-                duration = frame_count / fps
-                # Filter by length thresholds
-                if min_len <= duration <= max_len:
-                    valid_videos.append({'path': video_path, 'duration': duration})
-        except Exception as e:
-            click.echo(f"Warning: Could not analyze video {video_path}: {e}", err=True)
+    # Header reads are IO-bound, so overlap them across files with threads
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        probed_videos = list(tqdm(
+            executor.map(probe_video, all_video_files),
+            total=len(all_video_files),
+            desc="Analyzing all videos"
+        ))
+
+    # Filter by length thresholds
+    valid_videos = [
+        video_info for video_info in probed_videos
+        if video_info is not None and min_len <= video_info['duration'] <= max_len
+    ]
     
     click.echo(f"Found {len(valid_videos)} videos that meet the length criteria.")
 
+    # Sort once by path so every group is built in chronological order
+    # ('...-001', '...-002') and groups are visited in a stable order
+    valid_videos.sort(key=lambda x: x['path'])
+
     grouped_clips = defaultdict(list)
     for video_info in valid_videos:
         clip_path = video_info['path']
@@ -107,9 +158,6 @@ def create_dataset_cli(
 
     selected_videos_info = []
     for base_name, clips_info_list in grouped_clips.items():
-        # Sort by path to ensure chronological order ('...-001', '...-002')
-        clips_info_list.sort(key=lambda x: x['path'])
-        
         num_available = len(clips_info_list)
         eligible_for_sampling = []
 
@@ -143,11 +191,19 @@ def create_dataset_cli(
     video_lengths = [info['duration'] for info in selected_videos_info] # Already calculated
 
     click.echo(f"\nCopying files to '{output_dir}'...")
-    for f in tqdm(selected_file_paths, desc="Copying Files"):
-        try:
-            shutil.copy(f, output_dir)
-        except Exception as e:
-            click.echo(f"Error copying {f}: {e}", err=True)
+    # Copies are IO-bound and release the GIL, so run them concurrently.
+    # copyfile skips the extra chmod of shutil.copy and uses the kernel's
+    # zero-copy path (sendfile/copy_file_range) where available.
+    with ThreadPoolExecutor(max_workers=min(8, total_selected)) as executor:
+        futures = {
+            executor.submit(shutil.copyfile, f, output_dir / f.name): f
+            for f in selected_file_paths
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Copying Files"):
+            try:
+                future.result()
+            except Exception as e:
+                click.echo(f"Error copying {futures[future]}: {e}", err=True)
     
     click.echo(f"\n🎉 Successfully created dataset in: {output_dir}")
 
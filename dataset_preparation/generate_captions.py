@@ -1,5 +1,7 @@
 import os
 import click
+from pathlib import Path
+from functools import lru_cache
 import torch
 from transformers import (
     Qwen2_5_VLForConditionalGeneration, 
@@ -15,22 +17,45 @@ DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 MODEL_ID = "Ertugrul/Qwen2.5-VL-7B-Captioner-Relaxed"
 # MODEL_ID = "huihui-ai/Qwen2.5-VL-7B-Instruct-abliterated"
+# INT4 AWQ checkpoint: ~half the VRAM and weight traffic per decoded token (needs autoawq)
+# MODEL_ID = "Qwen/Qwen2.5-VL-7B-Instruct-AWQ"
 
-print("Loading model and tokenizer...")
-processor = AutoProcessor.from_pretrained(
-    MODEL_ID, 
-    trust_remote_code=True
-)
+processor = None
+model = None
+
+
+def load_model(
+    model_id: str
+):
+    """
+    Loads the captioning model and its processor.
+
+    Pre-quantized checkpoints (e.g. AWQ) are picked up from the model config,
+    so passing a quantized model_id is enough to run in INT4.
+
+    Args:
+        model_id: The Hugging Face model id or local path to load.
+    """
+    global processor, model
+
+    print("Loading model and tokenizer...")
+    processor = AutoProcessor.from_pretrained(
+        model_id, 
+        trust_remote_code=True
+    )
+    # Decoder-only generation needs left padding when batching prompts
+    processor.tokenizer.padding_side = "left"
+
+    model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
+        model_id, 
+        torch_dtype="auto", 
+        device_map="auto",
+        low_cpu_mem_usage=True,
+        trust_remote_code=True,
+        attn_implementation="flash_attention_2"
+    ).eval()
+    print("Model and tokenizer loaded successfully.")
 
-model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-    MODEL_ID, 
-    torch_dtype="auto", 
-    device_map="auto",
-    low_cpu_mem_usage=True,
-    trust_remote_code=True,
-    attn_implementation="flash_attention_2"
-).eval()
-print("Model and tokenizer loaded successfully.")
 
 PROMPT_TEMPLATE = f"""
 You are an expert video analyst. Your task is to create a single, concise, and descriptive paragraph for a 5-second video clip. 
@@ -56,49 +81,82 @@ Generate the caption now.
 """
 
 
-def generate_caption_for_video(
-    video_path: str, 
+@lru_cache(maxsize=None)
+def build_prompt(
+    trigger_word: str,
+    fps: int,
+    max_tokens: int
+) -> tuple[str, str]:
+    """
+    Builds the instruction prompt and the chat-template text for a run.
+
+    The rendered template only contains a placeholder for the video, so it
+    is identical for every video and is computed once per run.
+
+    Returns:
+        A (prompt_text, chat_text) tuple.
+    """
+    # Create the detailed prompt for the model
+    prompt_text = PROMPT_TEMPLATE.format(
+        trigger_word=trigger_word,
+        max_tokens=max_tokens
+    )
+
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "video", "video": "", "fps": fps},
+                {"type": "text", "text": prompt_text},
+            ],
+        }
+    ]
+    chat_text = processor.apply_chat_template(
+        messages, tokenize=False, add_generation_prompt=True
+    )
+    return prompt_text, chat_text
+
+
+def generate_captions_for_videos(
+    video_paths: list[str], 
     trigger_word: str,
     fps: int,
     max_tokens: int
-) -> str:
+) -> list[str]:
     """
-    Generates a caption for a single video file using the Qwen2.5-VL model.
+    Generates captions for a batch of video files using the Qwen2.5-VL model.
 
     Args:
-        video_path: The absolute path to the video file.
+        video_paths: The absolute paths to the video files.
         trigger_word: The action trigger word to include in the caption.
 
     Returns:
-        The generated caption as a string.
+        The generated captions as strings, in the same order as video_paths.
     """
     try:
-        # Create the detailed prompt for the model
-        prompt_text = PROMPT_TEMPLATE.format(
-            trigger_word=trigger_word,
-            max_tokens=max_tokens
-        )
+        prompt_text, chat_text = build_prompt(trigger_word, fps, max_tokens)
 
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "video",
-                        "video": f"file://{video_path}",
-                        "fps": fps,
-                    },
-                    {"type": "text", "text": prompt_text},
-                ],
-            }
+        batch_messages = [
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "video",
+                            "video": f"file://{video_path}",
+                            "fps": fps,
+                        },
+                        {"type": "text", "text": prompt_text},
+                    ],
+                }
+            ]
+            for video_path in video_paths
         ]
 
-        text = processor.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
-        )
-        image_inputs, video_inputs, video_kwargs = process_vision_info(messages, return_video_kwargs=True)
+        texts = [chat_text] * len(batch_messages)
+        image_inputs, video_inputs, video_kwargs = process_vision_info(batch_messages, return_video_kwargs=True)
         inputs = processor(
-            text=[text],
+            text=texts,
             images=image_inputs,
             videos=video_inputs,
             padding=True,
@@ -116,10 +174,20 @@ def generate_caption_for_video(
             generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
         )
 
-        return output_text[0].strip() if output_text else "Failed to generate caption."
+        return [
+            text.strip() if text else "Failed to generate caption."
+            for text in output_text
+        ]
 
     except Exception as e:
-        return f"An error occurred during caption generation: {e}"
+        if len(video_paths) > 1:
+            # Retry one by one so a single broken video doesn't fail the batch
+            return [
+                caption
+                for video_path in video_paths
+                for caption in generate_captions_for_videos([video_path], trigger_word, fps, max_tokens)
+            ]
+        return [f"An error occurred during caption generation: {e}"]
 
 
 @click.command()
@@ -149,11 +217,27 @@ def generate_caption_for_video(
     type=int,
     help='maximum number of tokens in output caption'
 )
+@click.option(
+    '--batch-size',
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='number of videos captioned per model.generate call'
+)
+@click.option(
+    '--model-id',
+    default=MODEL_ID,
+    show_default=True,
+    type=str,
+    help='captioning model to load, e.g. an AWQ-quantized Qwen2.5-VL checkpoint'
+)
 def main(
     input_folder: str, 
     trigger_word: str,
     fps: int,
-    max_tokens: int
+    max_tokens: int,
+    batch_size: int,
+    model_id: str
 ):
     """
     A script to generate captions for all MP4 videos in a folder using the
@@ -162,33 +246,46 @@ def main(
     click.echo(f"Starting video processing in: {input_folder}")
     click.echo(f"Using action trigger word: '{trigger_word}'")
 
-    # Iterate over all files in the specified directory
-    for filename in tqdm(os.listdir(input_folder)):
-        if filename.lower().endswith(".mp4"):
-            video_path = os.path.join(input_folder, filename)
-            absolute_video_path = os.path.abspath(video_path)
-            click.echo(f"Processing video: {filename}...")
+    load_model(model_id)
 
-            # Generate the caption for the video
-            caption = generate_caption_for_video(
-                absolute_video_path, 
+    with os.scandir(input_folder) as entries:
+        video_filenames = sorted(
+            entry.name for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(".mp4")
+        )
+
+    # Caption videos in batches to amortize the prompt prefill and weight reads
+    with tqdm(total=len(video_filenames)) as pbar:
+        for batch_start in range(0, len(video_filenames), batch_size):
+            batch_filenames = video_filenames[batch_start:batch_start + batch_size]
+            absolute_video_paths = [
+                os.path.abspath(os.path.join(input_folder, filename))
+                for filename in batch_filenames
+            ]
+            click.echo(f"Processing videos: {', '.join(batch_filenames)}...")
+
+            # Generate the captions for the batch
+            captions = generate_captions_for_videos(
+                absolute_video_paths, 
                 trigger_word,
                 fps=fps,
                 max_tokens=max_tokens
             )
 
-            # Create the corresponding .txt filename and path
-            base_filename = os.path.splitext(filename)[0]
-            caption_filename = f"{base_filename}.txt"
-            caption_filepath = os.path.join(input_folder, caption_filename)
-
-            # Save the generated caption to the text file
-            try:
-                with open(caption_filepath, "w", encoding="utf-8") as f:
-                    f.write(caption)
-                click.echo(f"  -> Saved caption to: {caption_filename}")
-            except IOError as e:
-                click.echo(f"  -> Error saving caption file: {e}", err=True)
+            for filename, caption in zip(batch_filenames, captions):
+                # Create the corresponding .txt filename and path
+                base_filename = os.path.splitext(filename)[0]
+                caption_filename = f"{base_filename}.txt"
+                caption_filepath = Path(input_folder) / caption_filename
+
+                # Save the generated caption to the text file
+                try:
+                    caption_filepath.write_text(caption, encoding="utf-8")
+                    click.echo(f"  -> Saved caption to: {caption_filename}")
+                except IOError as e:
+                    click.echo(f"  -> Error saving caption file: {e}", err=True)
+
+            pbar.update(len(batch_filenames))
 
     click.echo("Processing complete.")
 
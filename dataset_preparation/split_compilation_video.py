@@ -1,9 +1,12 @@
+import os
 import subprocess
 import multiprocessing
 import click
+import av
 from pathlib import Path
 from scenedetect import (
-    detect, 
+    open_video, 
+    SceneManager, 
     ContentDetector, 
     split_video_ffmpeg
 )
@@ -14,15 +17,12 @@ def split_video_with_ffmpeg(
 ) -> list[Path]:
     """Splits the input video into three horizontal parts using FFmpeg."""
     output_folder.mkdir(parents=True, exist_ok=True)
-    ffprobe_cmd = [
-        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height', '-of', 'csv=p=0', str(input_video_path)
-    ]
     try:
-        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=True)
-        width, height = map(int, result.stdout.strip().split(','))
+        with av.open(str(input_video_path)) as container:
+            codec_context = container.streams.video[0].codec_context
+            width, height = codec_context.width, codec_context.height
         third_width = width // 3
-    except (subprocess.CalledProcessError, ValueError) as e:
+    except (av.error.FFmpegError, IndexError) as e:
         click.echo(f"Error getting video dimensions: {e}", err=True)
         return []
 
@@ -33,23 +33,31 @@ def split_video_with_ffmpeg(
         output_folder / "part3.mp4",
     ]
 
-    ffmpeg_commands = [
-        ['ffmpeg', '-y', '-i', str(input_video_path), '-vf', f'crop={third_width}:{height}:0:0', 
-         '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', str(split_video_paths[0])],
-        
-        ['ffmpeg', '-y', '-i', str(input_video_path), '-vf', f'crop={third_width}:{height}:{third_width}:0', 
-         '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', str(split_video_paths[1])],
-        
-        ['ffmpeg', '-y', '-i', str(input_video_path), '-vf', f'crop={third_width}:{height}:{2 * third_width}:0', 
-         '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', str(split_video_paths[2])]
+    # Decode the input once and fan it out to the three crops with the split filter
+    filter_complex = (
+        f"[0:v]split=3[a][b][c];"
+        f"[a]crop={third_width}:{height}:0:0[o1];"
+        f"[b]crop={third_width}:{height}:{third_width}:0[o2];"
+        f"[c]crop={third_width}:{height}:{2 * third_width}:0[o3]"
+    )
+    # Use a hardware decoder when one is available; ffmpeg falls back to software
+    # decoding otherwise and downloads frames to system memory for the crops
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-hwaccel', 'auto', '-i', str(input_video_path),
+        '-filter_complex', filter_complex
     ]
-    for cmd in ffmpeg_commands:
-        subprocess.run(
-            cmd, 
-            check=True, 
-            stdout=subprocess.DEVNULL, 
-            stderr=subprocess.DEVNULL
-        )
+    for label, split_video_path in zip(['[o1]', '[o2]', '[o3]'], split_video_paths):
+        ffmpeg_cmd += [
+            '-map', label, '-map', '0:a?',
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23', str(split_video_path)
+        ]
+
+    subprocess.run(
+        ffmpeg_cmd, 
+        check=True, 
+        stdout=subprocess.DEVNULL, 
+        stderr=subprocess.DEVNULL
+    )
     click.echo("✅ Video splitting complete.")
     return split_video_paths
 
@@ -64,7 +72,14 @@ def detect_scenes_for_part(
     click.echo(f"▶️  Starting scene detection for part {part_num}...")
     video_path_str = str(video_path)
     output_template = str(scenes_folder / 'scene-$SCENE_NUMBER.mp4')
-    scene_list = detect(video_path_str, ContentDetector())
+    # PyAV backend with threaded decoding; frames are downscaled before the
+    # HSV comparison, which scales with resolution
+    video = open_video(video_path_str, backend='pyav', threading_mode='AUTO')
+    scene_manager = SceneManager()
+    scene_manager.auto_downscale = True
+    scene_manager.add_detector(ContentDetector())
+    scene_manager.detect_scenes(video=video, show_progress=False)
+    scene_list = scene_manager.get_scene_list()
     if not scene_list:
         click.echo(f"⚠️  No scenes detected in {video_path.name}.")
         return
@@ -82,17 +97,41 @@ def consolidate_scenes(
     final_scenes_dir.mkdir(exist_ok=True)
     click.echo("\n consolidating all scenes into a single folder...")
 
+    # Move order doesn't matter: every file gets a unique, part-prefixed name.
+    # all_scenes itself also ends with '_scenes', so leave it out explicitly.
+    scene_dirs = [
+        Path(entry.path) for entry in os.scandir(output_dir)
+        if entry.is_dir() and entry.name.endswith('_scenes') and entry.name != final_scenes_dir.name
+    ]
+
     scene_count = 0
-    scene_dirs = sorted([p for p in output_dir.iterdir() if p.is_dir() and p.name.endswith('_scenes')])
-
-    for scene_dir in scene_dirs:
-        part_prefix = scene_dir.name.replace('_scenes', '')
-        for scene_file in sorted(scene_dir.glob("*.mp4")):
-            # Create a new unique name to avoid collisions, e.g., "part1-scene-001.mp4"
-            new_name = f"{part_prefix}-{scene_file.name}"
-            new_path = final_scenes_dir / new_name
-            scene_file.rename(new_path) # Move file to the new directory with a new name
-            scene_count += 1
+    # Rename relative to open directory descriptors (renameat) where supported,
+    # so the kernel doesn't re-resolve the full directory path for every file
+    use_dir_fd = os.replace in os.supports_dir_fd
+    dst_fd = os.open(final_scenes_dir, os.O_RDONLY | os.O_DIRECTORY) if use_dir_fd else None
+    try:
+        for scene_dir in scene_dirs:
+            part_prefix = scene_dir.name.replace('_scenes', '')
+            names = [entry.name for entry in os.scandir(scene_dir) if entry.name.endswith('.mp4')]
+
+            if use_dir_fd:
+                src_fd = os.open(scene_dir, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    for name in names:
+                        # Create a new unique name to avoid collisions, e.g., "part1-scene-001.mp4"
+                        os.replace(name, f"{part_prefix}-{name}", src_dir_fd=src_fd, dst_dir_fd=dst_fd)
+                finally:
+                    os.close(src_fd)
+            else:
+                for name in names:
+                    os.replace(
+                        os.path.join(scene_dir, name),
+                        os.path.join(final_scenes_dir, f"{part_prefix}-{name}")
+                    )
+            scene_count += len(names)
+    finally:
+        if dst_fd is not None:
+            os.close(dst_fd)
     
     click.echo(f"✅ Moved {scene_count} scenes to '{final_scenes_dir}'.")
 
@@ -148,17 +187,9 @@ def process_video_cli(
         click.echo("Could not split video. Exiting.", err=True)
         return
 
-    processes = []
-    for i, video_path in enumerate(split_video_paths):
-        process = multiprocessing.Process(
-            target=detect_scenes_for_part, 
-            args=(video_path, i + 1, output_dir)
-        )
-        processes.append(process)
-        process.start()
-
-    for process in processes:
-        process.join()
+    tasks = [(video_path, i + 1, output_dir) for i, video_path in enumerate(split_video_paths)]
+    with multiprocessing.Pool(processes=len(tasks)) as pool:
+        pool.starmap(detect_scenes_for_part, tasks)
 
     consolidate_scenes(output_dir, cleanup)
 
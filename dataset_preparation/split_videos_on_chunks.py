@@ -1,16 +1,130 @@
+import os
 import subprocess
 import click
 from pathlib import Path
 import multiprocessing
+import psutil
+import av
+from typing import Optional
 from tqdm import tqdm
 
+# H.264 encoders in order of preference, with their quality settings
+ENCODER_ARGS = {
+    'h264_nvenc': ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0'],
+    'h264_videotoolbox': ['-c:v', 'h264_videotoolbox', '-q:v', '55', '-realtime', '1'],
+    'h264_qsv': ['-c:v', 'h264_qsv', '-global_quality', '23'],
+    'libx264': ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23'],
+}
+
+def detect_video_encoder() -> str:
+    """
+    Picks the fastest H.264 encoder that works on this machine.
+
+    FFmpeg builds often list hardware encoders without the hardware being
+    present, so each candidate is verified with a tiny test encode using the
+    same settings process_video passes to it.
+
+    Returns:
+        The name of the encoder, falling back to 'libx264'.
+    """
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True, text=True, check=True
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return 'libx264'
+
+    for encoder in ENCODER_ARGS:
+        if encoder == 'libx264' or f" {encoder} " not in result.stdout:
+            continue
+        test_cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1',
+            *ENCODER_ARGS[encoder], '-f', 'null', '-'
+        ]
+        if subprocess.run(test_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+            return encoder
+    return 'libx264'
+
+def probe_video_stream(
+    video_path: Path
+) -> Optional[dict]:
+    """
+    Reads the codec, size and frame rate of a video's first video stream,
+    and whether the file carries any audio.
+
+    Args:
+        video_path (Path): Path to the video file.
+
+    Returns:
+        A dict with 'codec', 'width', 'height', 'fps' and 'has_audio' keys, or
+        None if the file could not be probed.
+    """
+    try:
+        with av.open(str(video_path)) as container:
+            stream = container.streams.video[0]
+            return {
+                'codec': stream.codec_context.name,
+                'width': stream.codec_context.width,
+                'height': stream.codec_context.height,
+                'fps': stream.average_rate,
+                'has_audio': bool(container.streams.audio),
+            }
+    except (av.error.FFmpegError, IndexError):
+        return None
+
+def has_chunk_aligned_keyframes(
+    video_path: Path, 
+    chunk_length: int, 
+    tolerance: float = 0.05
+) -> bool:
+    """
+    Checks that a keyframe falls on every chunk boundary of a video, so it can
+    be segmented with stream copy into chunks of exactly chunk_length seconds.
+
+    Only packets are demuxed; no frame is decoded.
+
+    Args:
+        video_path (Path): Path to the video file.
+        chunk_length (int): The chunk length in seconds.
+        tolerance (float): Maximum distance in seconds between a boundary and its keyframe.
+
+    Returns:
+        True if every boundary before the end of the video has a keyframe.
+    """
+    try:
+        with av.open(str(video_path)) as container:
+            stream = container.streams.video[0]
+            start_pts = stream.start_time or 0
+            keyframe_times = []
+            end_time = 0.0
+            for packet in container.demux(stream):
+                if packet.pts is None:
+                    continue
+                packet_time = float((packet.pts - start_pts) * stream.time_base)
+                end_time = max(end_time, packet_time)
+                if packet.is_keyframe:
+                    keyframe_times.append(packet_time)
+    except (av.error.FFmpegError, IndexError):
+        return False
+
+    boundary = chunk_length
+    while boundary < end_time:
+        if not any(abs(keyframe_time - boundary) <= tolerance for keyframe_time in keyframe_times):
+            return False
+        boundary += chunk_length
+    return True
+
 def process_video(
     video_path: Path, 
     output_dir: Path, 
     width: int, 
     height: int, 
     fps: int, 
-    chunk_length: int
+    chunk_length: int,
+    encoder: str = 'libx264',
+    threads: int = 0
 ):
     """
     Processes a single video file to resize, change FPS, and split into precise chunks.
@@ -22,35 +136,75 @@ def process_video(
         height (int): Target height for resizing.
         fps (int): Target frames per second.
         chunk_length (int): The exact length of each video chunk in seconds.
+        encoder (str): H.264 encoder to use, one of ENCODER_ARGS.
+        threads (int): Decoder, filter and encoder threads per FFmpeg process (0 lets FFmpeg decide).
     """
     try:
         output_pattern = output_dir / f"{video_path.stem}-chunk-%03d.mp4"
         vf_filter = f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,pad=ceil(iw/2)*2:ceil(ih/2)*2"
 
-        keyframe_expr = f'expr:gte(t,n_forced*{chunk_length})'
+        stream_info = probe_video_stream(video_path)
+        if (
+            stream_info is not None
+            and stream_info['codec'] == 'h264'
+            and stream_info['width'] == width
+            and stream_info['height'] == height
+            and stream_info['fps'] == fps
+            and has_chunk_aligned_keyframes(video_path, chunk_length)
+        ):
+            # Already at the target format with a keyframe on every cut point:
+            # just split on the existing keyframes
+            ffmpeg_cmd = [
+                'ffmpeg',
+                '-y',
+                '-i', str(video_path),
+                '-c', 'copy',
+                '-f', 'segment',
+                '-segment_time', str(chunk_length),
+                '-segment_time_delta', '0.05',
+                '-reset_timestamps', '1',
+                str(output_pattern)
+            ]
+        else:
+            # Fixed GOP of exactly one chunk so libx264 emits an IDR at every cut point.
+            # Hardware encoders treat -g as an upper bound only, so they still need
+            # keyframes forced at the exact cut points
+            gop = fps * chunk_length
+            if encoder == 'libx264':
+                keyframe_args = ['-keyint_min', str(gop), '-sc_threshold', '0']
+            else:
+                keyframe_args = ['-force_key_frames', f'expr:gte(t,n_forced*{chunk_length})']
 
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-y',
-            '-i', str(video_path),
+            # Skip the audio pipeline entirely for silent scenes
+            if stream_info is not None and not stream_info['has_audio']:
+                audio_args = ['-an']
+            else:
+                audio_args = ['-c:a', 'aac', '-b:a', '128k']
 
-            '-vf', vf_filter,
-            '-r', str(fps),
+            ffmpeg_cmd = [
+                'ffmpeg',
+                '-y',
+                '-threads', str(threads),
+                '-i', str(video_path),
 
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            '-crf', '23',
+                '-vf', vf_filter,
+                '-filter_threads', str(threads),
+                '-r', str(fps),
 
-            '-c:a', 'aac',
-            '-b:a', '128k',
+                *ENCODER_ARGS[encoder],
+                '-threads', str(threads),
+                '-g', str(gop),
+                *keyframe_args,
 
-            '-f', 'segment',
-            '-segment_time', str(chunk_length),  # Use the parameter here
-            '-reset_timestamps', '1',
-            '-force_key_frames', keyframe_expr, # Force keyframes at exact cut points
-            
-            str(output_pattern)
-        ]
+                *audio_args,
+
+                '-f', 'segment',
+                '-segment_time', str(chunk_length),  # Use the parameter here
+                '-segment_time_delta', '0.05',
+                '-reset_timestamps', '1',
+                
+                str(output_pattern)
+            ]
 
         subprocess.run(
             ffmpeg_cmd,
@@ -63,6 +217,14 @@ def process_video(
     except Exception as e:
         click.echo(f"\nAn unexpected error occurred with {video_path.name}: {e}", err=True)
 
+def _init_worker():
+    """Warms PyAV's codec tables once per worker so the first probe doesn't pay for it."""
+    av.codec.Codec('h264', 'r')
+
+def _process_video_star(args: tuple):
+    """Unpacks a task tuple for use with Pool.imap_unordered."""
+    return process_video(*args)
+
 @click.command()
 @click.option(
     '--input-dir',
@@ -104,13 +266,20 @@ def process_video(
     show_default=True,
     help="The maximum length of each video chunk in seconds."
 )
+@click.option(
+    '--max-workers',
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of videos processed in parallel. Defaults to a quarter of the physical cores."
+)
 def batch_process_cli(
     input_dir: Path, 
     output_dir: Path, 
     width: int, 
     height: int, 
     fps: int, 
-    chunk_length: int
+    chunk_length: int,
+    max_workers: int
 ):
     """
     A tool to batch process videos with custom resolution, FPS, and precise chunk length.
@@ -119,19 +288,39 @@ def batch_process_cli(
     final_output_dir.mkdir(parents=True, exist_ok=True)
     click.echo(f"Output will be saved in: {final_output_dir}")
 
-    video_files = list(input_dir.glob("*.mp4"))
+    video_files = [
+        Path(entry.path) for entry in os.scandir(input_dir)
+        if entry.is_file() and entry.name.lower().endswith('.mp4')
+    ]
     if not video_files:
         click.echo(f"No .mp4 videos found in '{input_dir}'.")
         return
 
     click.echo(f"Found {len(video_files)} videos to process. Starting...")
 
-    tasks = [(video_path, final_output_dir, width, height, fps, chunk_length) for video_path in video_files]
+    encoder = detect_video_encoder()
+    click.echo(f"Using video encoder: {encoder}")
+
+    # Each FFmpeg process runs its own decoder, filter and encoder threads, so cap
+    # both the pool size and the threads per process to keep the total close to the core count
+    if max_workers is None:
+        max_workers = max(1, (psutil.cpu_count(logical=False) or 1) // 4)
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+    click.echo(f"Using {max_workers} worker(s) with {threads} FFmpeg thread(s) each")
+
+    tasks = [
+        (video_path, final_output_dir, width, height, fps, chunk_length, encoder, threads)
+        for video_path in video_files
+    ]
 
-    with multiprocessing.Pool() as pool:
-        with tqdm(total=len(tasks), desc="Processing Videos") as pbar:
-            for _ in pool.starmap(process_video, tasks):
-                pbar.update()
+    with multiprocessing.Pool(max_workers, initializer=_init_worker) as pool:
+        # Stream completions so the progress bar advances as each video finishes
+        for _ in tqdm(
+            pool.imap_unordered(_process_video_star, tasks, chunksize=1),
+            total=len(tasks),
+            desc="Processing Videos"
+        ):
+            pass
 
     click.echo("\nBatch processing complete!")
     click.echo(f"All processed videos are saved in: {final_output_dir}")
@@ -1,60 +1,82 @@
-import websocket
+import asyncio
+import websockets
+import httpx
 import uuid
 import json
-import urllib.request
 import urllib.parse
 import os
 import argparse
 import base64
-import requests
-import time
 import random
 
 from fastapi import FastAPI, Form, File, UploadFile
 from fastapi.responses import JSONResponse
 import uvicorn
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Union, Dict, Any, Tuple
 
 server_address = "127.0.0.1:8188"
-client_id = str(uuid.uuid4())
 workflow_api_json = {}
+# Node lookups by title/class_type, built once when the workflow is loaded
+NODE_BY_TITLE: Dict[str, str] = {}
+NODE_BY_TYPE: Dict[str, str] = {}
 VERBOSE = False
 
+# Shared async HTTP client so ComfyUI requests reuse pooled keep-alive connections
+# without blocking the event loop
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=httpx.Timeout(60.0),
+)
+
 # --- ComfyUI Interaction Logic ---
 
-def find_node_id(
-    workflow: Dict[str, Any], 
-    node_title: Optional[str] = None, 
-    node_type: Optional[str] = None
-) -> Optional[str]:
-    """Finds a node's ID by its title or class_type."""
+def build_node_index(
+    workflow: Dict[str, Any]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Maps node titles and class_types to the ID of the first matching node."""
+    node_by_title: Dict[str, str] = {}
+    node_by_type: Dict[str, str] = {}
     for node_id, node_data in workflow.items():
         if isinstance(node_data, dict):
-            if node_title and node_data.get("_meta", {}).get("title") == node_title:
-                return node_id
-            if node_type and node_data.get("class_type") == node_type:
-                return node_id
-    return None
-
-def queue_prompt(
-    prompt_workflow: Dict[str, Any]
+            title = node_data.get("_meta", {}).get("title")
+            if title:
+                node_by_title.setdefault(title, node_id)
+            class_type = node_data.get("class_type")
+            if class_type:
+                node_by_type.setdefault(class_type, node_id)
+    return node_by_title, node_by_type
+
+def set_node_inputs(
+    workflow: Dict[str, Any], 
+    node_id: str, 
+    **inputs: Any
+) -> None:
+    """Replaces a node in a shallow workflow copy with one whose inputs are updated,
+    leaving the shared template node untouched."""
+    node_data = workflow[node_id]
+    workflow[node_id] = {**node_data, "inputs": {**node_data.get("inputs", {}), **inputs}}
+
+async def queue_prompt(
+    prompt_workflow: Dict[str, Any], 
+    client_id: str
 ) -> Optional[Dict[str, Any]]:
     try:
         p = {"prompt": prompt_workflow, "client_id": client_id}
         data = json.dumps(p).encode('utf-8')
-        req = urllib.request.Request(f"http://{server_address}/prompt", data=data)
-        response = urllib.request.urlopen(req)
-        return json.loads(response.read())
+        response = await http_client.post(f"http://{server_address}/prompt", content=data)
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         print(f"Error queuing prompt: {e}")
         return None
 
-def get_history(
+async def get_history(
     prompt_id: str
 ) -> Dict[str, Any]:
     try:
-        with urllib.request.urlopen(f"http://{server_address}/history/{prompt_id}") as response:
-            return json.loads(response.read())
+        response = await http_client.get(f"http://{server_address}/history/{prompt_id}")
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         print(f"Error fetching history: {e}")
         return {}
@@ -77,47 +99,55 @@ def parse_video_path_from_output(
         return None
     return None
 
-def get_final_video_path(
+async def get_final_video_path(
     prompt_id: str, 
-    target_node_id: str
+    target_node_id: str, 
+    client_id: str
 ) -> Optional[str]:
-    ws = websocket.WebSocket()
     try:
         if VERBOSE: print("Connecting to WebSocket to monitor target node...")
-        ws.connect(f"ws://{server_address}/ws?clientId={client_id}")
-        ws.settimeout(300)
-        while True:
-            out = ws.recv()
-            if isinstance(out, str):
-                message = json.loads(out)
-                if VERBOSE: print(f"RECEIVED WS MESSAGE: {json.dumps(message, indent=2)}")
-                if message.get('type') == 'executed' and message.get('data', {}).get('node') == target_node_id:
-                    if VERBOSE: print(f"SUCCESS: Found executed message for target node {target_node_id}.")
-                    outputs = message.get('data', {}).get('output', {})
-                    return parse_video_path_from_output(outputs)
-    except websocket.WebSocketTimeoutException:
+        async with websockets.connect(f"ws://{server_address}/ws?clientId={client_id}", max_size=None) as ws:
+            while True:
+                out = await asyncio.wait_for(ws.recv(), timeout=300)
+                if isinstance(out, str):
+                    message = json.loads(out)
+                    if VERBOSE: print(f"RECEIVED WS MESSAGE: {json.dumps(message, indent=2)}")
+                    data = message.get('data', {})
+                    # ComfyUI keeps one socket per clientId, so each request uses its own id;
+                    # also match the prompt so a message for another prompt is never accepted
+                    if (
+                        message.get('type') == 'executed'
+                        and data.get('prompt_id') == prompt_id
+                        and data.get('node') == target_node_id
+                    ):
+                        if VERBOSE: print(f"SUCCESS: Found executed message for target node {target_node_id}.")
+                        outputs = data.get('output', {})
+                        return parse_video_path_from_output(outputs)
+    except asyncio.TimeoutError:
         print("ERROR: WebSocket timed out.")
     except Exception as e:
         print(f"Error in websocket communication: {e}")
-    finally:
-        if ws.connected: ws.close()
     print("WebSocket failed. Falling back to history...")
-    time.sleep(1)
-    history = get_history(prompt_id).get(prompt_id, {})
+    await asyncio.sleep(1)
+    history = (await get_history(prompt_id)).get(prompt_id, {})
     if history and target_node_id in history.get('outputs', {}):
         return parse_video_path_from_output(history['outputs'][target_node_id])
     return None
 
-def upload_image(
+async def upload_image(
     image_data: Union[UploadFile, str]
 ) -> str:
     if isinstance(image_data, str):
         img_bytes = base64.b64decode(image_data)
         files = {'image': ("image.png", img_bytes, 'image/png')}
     else:
-        files = {'image': (image_data.filename, image_data.file.read(), image_data.content_type)}
+        await image_data.seek(0)
+        # UploadFile.read() moves disk reads off the event loop; httpx would read
+        # a file object synchronously while building the multipart body
+        image_content = await image_data.read()
+        files = {'image': (image_data.filename, image_content, image_data.content_type)}
     data = {"overwrite": "true"}
-    response = requests.post(f"http://{server_address}/upload/image", files=files, data=data)
+    response = await http_client.post(f"http://{server_address}/upload/image", files=files, data=data)
     response.raise_for_status()
     return response.json()['name']
 
@@ -130,27 +160,28 @@ async def generate_video(
     negative_prompt: Optional[str] = Form(""),
 ):
     try:
-        prompt_workflow = json.loads(json.dumps(workflow_api_json))
+        # Shallow copy: only the nodes patched below get their own copies
+        prompt_workflow = dict(workflow_api_json)
 
-        image_node_id = find_node_id(prompt_workflow, node_title="load_image")
-        pos_prompt_node_id = find_node_id(prompt_workflow, node_title="positive_prompt")
-        neg_prompt_node_id = find_node_id(prompt_workflow, node_title="negative_prompt")
-        output_node_id = find_node_id(prompt_workflow, node_title="output_paths")
-        k_sampler_node_id = find_node_id(prompt_workflow, node_type="KSampler") # Find the KSampler
+        image_node_id = NODE_BY_TITLE.get("load_image")
+        pos_prompt_node_id = NODE_BY_TITLE.get("positive_prompt")
+        neg_prompt_node_id = NODE_BY_TITLE.get("negative_prompt")
+        output_node_id = NODE_BY_TITLE.get("output_paths")
+        k_sampler_node_id = NODE_BY_TYPE.get("KSampler") # Find the KSampler
 
         if not all([image_node_id, pos_prompt_node_id, neg_prompt_node_id, output_node_id]):
             missing = [title for title, node_id in [("load_image", image_node_id), ("positive_prompt", pos_prompt_node_id), ("negative_prompt", neg_prompt_node_id), ("output_paths", output_node_id)] if not node_id]
             return JSONResponse(status_code=404, content={"error": f"Could not find required nodes. Missing titles: {', '.join(missing)}"})
 
         # Modify the workflow inputs
-        image_filename = upload_image(image)
-        prompt_workflow[image_node_id]["inputs"]["image"] = image_filename
-        prompt_workflow[pos_prompt_node_id]["inputs"]["text"] = prompt
-        prompt_workflow[neg_prompt_node_id]["inputs"]["text"] = negative_prompt
+        image_filename = await upload_image(image)
+        set_node_inputs(prompt_workflow, image_node_id, image=image_filename)
+        set_node_inputs(prompt_workflow, pos_prompt_node_id, text=prompt)
+        set_node_inputs(prompt_workflow, neg_prompt_node_id, text=negative_prompt)
 
         if k_sampler_node_id:
             random_seed = random.randint(0, 999999999999999)
-            prompt_workflow[k_sampler_node_id]["inputs"]["seed"] = random_seed
+            set_node_inputs(prompt_workflow, k_sampler_node_id, seed=random_seed)
             if VERBOSE:
                 print(f"Randomized KSampler seed (node {k_sampler_node_id}) to: {random_seed}")
         else:
@@ -158,12 +189,13 @@ async def generate_video(
                 print("Warning: KSampler node not found. Seed will not be randomized, which may cause caching issues.")
 
         # Queue the prompt and get the result
-        queued_item = queue_prompt(prompt_workflow)
+        client_id = str(uuid.uuid4())
+        queued_item = await queue_prompt(prompt_workflow, client_id)
         if not queued_item or 'prompt_id' not in queued_item:
             return JSONResponse(status_code=500, content={"error": "Failed to queue prompt in ComfyUI."})
 
         prompt_id = queued_item['prompt_id']
-        video_path = get_final_video_path(prompt_id, output_node_id)
+        video_path = await get_final_video_path(prompt_id, output_node_id, client_id)
 
         if not video_path:
             return JSONResponse(status_code=500, content={"error": "Generation finished, but failed to extract video path. Run with --verbose for details."})
@@ -176,7 +208,7 @@ async def generate_video(
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 def main():
-    global server_address, workflow_api_json, VERBOSE
+    global server_address, workflow_api_json, NODE_BY_TITLE, NODE_BY_TYPE, VERBOSE
 
     parser = argparse.ArgumentParser(description="A robust FastAPI wrapper for ComfyUI video generation.")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to bind the FastAPI server to.")
@@ -197,6 +229,7 @@ def main():
     print("Loading API format workflow from:", args.workflow)
     with open(args.workflow, 'r', encoding='utf-8') as f:
         workflow_api_json = json.load(f)
+    NODE_BY_TITLE, NODE_BY_TYPE = build_node_index(workflow_api_json)
     print("Workflow loaded successfully.")
     
     print(f"Starting FastAPI server on {args.host}:{args.port}")